@@ -1,28 +1,57 @@
 """
 Main FastAPI application configuration
 """
+import asyncio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
-from db.database import create_tables
+from db.database import create_tables, engine
 # Import routers
 from app.routers.tasks     import router as tasks_router
 from app.routers.users     import router as users_router
 from app.routers.deep_seek import router as deepseek_router
+from app.routers.admin     import router as admin_router
 
 from fastapi.middleware.cors import CORSMiddleware
+from app.utils.load_shedding import LoadSheddingMiddleware, RouteGroup
+from app.utils.profiling import SlowRequestMiddleware, slow_requests
+from app.utils.auth.jwt.token_denylist import denylist, sync_denylist
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create tables on startup
     create_tables()
+    # Load the revoked tokens before serving, a failure here stops the worker
+    # instead of accepting revoked tokens
+    await run_in_threadpool(denylist.refresh)
+    # Keep this worker's revoked token cache in sync with the database
+    denylist_task = asyncio.create_task(sync_denylist(denylist))
     yield
-    # Clean up resources on shutdown if needed
-    pass
+    # Clean up resources on shutdown
+    denylist_task.cancel()
 
 # Create FastAPI app
 app = FastAPI(title="ToDo List API", redirect_slashes=True, lifespan=lifespan)
 
-# Enable CORS
+# Capture timings, SQL and stack samples of slow requests (innermost, so shed
+# requests are not recorded). The admin endpoints are slow on purpose.
+slow_requests.instrument_engine(engine)
+app.add_middleware(SlowRequestMiddleware, exclude_prefixes=("/admin",))
+
+# Shed load when requests back up, expensive groups get a smaller share of the
+# in-flight budget so cheap reads keep working the longest
+app.add_middleware(
+    LoadSheddingMiddleware,
+    groups=[
+        RouteGroup("reads",  [("GET", r"/tasks/\d+"), ("GET", r"/users/me"), ("GET", r"/")], share=1.0),
+        RouteGroup("writes", [("POST", r"/tasks/?"), ("PUT", r"/tasks/\d+"), ("DELETE", r"/tasks/\d+")], share=0.8),
+        RouteGroup("auth",   [("*", r"/users/(login|register|refresh|logout)")], share=0.6),
+        RouteGroup("lists",  [("GET", r"/tasks/?"), ("GET", r"/users/?")], share=0.6),
+        RouteGroup("deep",   [("*", r"/deep/?")], share=0.3, max_inflight=8, target_latency=10.0),
+    ],
+)
+
+# Enable CORS (added last so it also wraps the load shedding responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins, you can specify a list of allowed origins
@@ -35,6 +64,7 @@ app.add_middleware(
 app.include_router(users_router,    prefix="/users", tags=["users"])
 app.include_router(tasks_router,    prefix="/tasks", tags=["tasks"])
 app.include_router(deepseek_router, prefix="/deep",  tags=["deep_seek"])
+app.include_router(admin_router,    prefix="/admin", tags=["admin"])
 
 # Root endpoint
 @app.get("/", tags=["Root"])
@@ -20,6 +20,15 @@ class RefreshToken(SQLModel, table=True): # type: ignore
     user_id: int = Field(foreign_key="users.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class RevokedToken(SQLModel, table=True): # type: ignore
+    __tablename__ = "revoked_tokens" # type: ignore
+
+    id: int | None = Field(default=None, primary_key=True)
+    jti: str = Field(index=True, unique=True)
+    expires_at: datetime = Field(index=True)
+    user_id: int = Field(foreign_key="users.id", index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
 class UserBase(BaseModel):
     username: str
     email: EmailStr
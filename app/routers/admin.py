@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Annotated
+from app.utils.auth.jwt.jwt_bearer import AdminBearer
+from app.utils.profiling import profiler, slow_requests, PROFILE_MAX_SECONDS
+
+router = APIRouter()
+
+# Create an admin bearer instance
+admin_bearer = AdminBearer()
+# Create a dependency to check the token belongs to an admin
+checkAdmin = Annotated[str, Depends(admin_bearer)]
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(token: checkAdmin, seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS)):
+    """Sample every thread of this worker for N seconds and return collapsed stacks (flamegraph format)"""
+    stacks = await run_in_threadpool(profiler.run, seconds)
+    if stacks is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running"
+        )
+    return stacks
+
+
+@router.get("/slow-requests")
+def get_slow_requests(token: checkAdmin, limit: int = Query(20, gt=0)):
+    """Get the latest requests slower than SLOW_REQUEST_THRESHOLD captured by this worker"""
+    return slow_requests.recent(limit)
@@ -1,7 +1,9 @@
 import os
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Depends
 from dotenv import load_dotenv
 import openai
+from app.utils.rate_limit import RateLimiter
+from app.utils.profiling import ProfiledRoute
 
 # Load environment variables from .env file
 load_dotenv()
@@ -9,9 +11,11 @@ load_dotenv()
 # Set your OpenAI API key
 openai.api_key = os.getenv("OPENAPI_KEY")
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+# Every request costs an upstream call, limit per user and per IP
+deep_limit = RateLimiter("deep", times=20, seconds=60, key="user", ip_times=40)
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(deep_limit)])
 async def home(request: Request):
     try:
         body = await request.body()
@@ -4,8 +4,9 @@ from typing import List, Annotated
 from db.database import pgSession
 from app.models.task import Task, TaskCreate, TaskResponse, TaskUpdate
 from app.utils.auth.jwt.jwt_bearer import JWTBearer
+from app.utils.profiling import ProfiledRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 # Create a JWT bearer instance
 jwt_bearer = JWTBearer()
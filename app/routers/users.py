@@ -1,18 +1,25 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from sqlmodel import select
-from app.models.user import User, UserCreate, UserResponse, TokenResponse, LoginRequest, RefreshToken, RefreshRequest
+from sqlalchemy.exc import IntegrityError
+from app.models.user import User, UserCreate, UserResponse, TokenResponse, LoginRequest, RefreshToken, RefreshRequest, RevokedToken
 from db.database import pgSession
 from app.utils.auth.utils import hash_password, verify_password
 from app.utils.auth.jwt.jwt_handler import create_tokens, decode_token, create_refresh_token
 from app.utils.auth.jwt.jwt_bearer import JWTBearer, decode_token
+from app.utils.auth.jwt.token_denylist import denylist
+from app.utils.rate_limit import RateLimiter
+from app.utils.profiling import ProfiledRoute
 from typing import List, Annotated, cast
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 # Create a JWT bearer instance
 jwt_bearer = JWTBearer()
 # Create a dependency to check the token
 checkToken = Annotated[str, Depends(jwt_bearer)]
+# Rate limits for the bcrypt heavy endpoints
+login_limit    = RateLimiter("login",    times=10, seconds=60)
+register_limit = RateLimiter("register", times=5,  seconds=60)
 
 
 @router.get('', response_model=List[UserResponse])
@@ -33,7 +40,7 @@ def get_me(token: checkToken, session: pgSession):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
 
-@router.post("/register", status_code=201, response_model=TokenResponse)
+@router.post("/register", status_code=201, response_model=TokenResponse, dependencies=[Depends(register_limit)])
 def create_user(user: UserCreate, session: pgSession):
     """Create a new user and return JWT tokens"""
     # Check if user already exists
@@ -84,7 +91,7 @@ def create_user(user: UserCreate, session: pgSession):
     return tokens
 
 
-@router.post("/login", status_code=200, response_model=TokenResponse)
+@router.post("/login", status_code=200, response_model=TokenResponse, dependencies=[Depends(login_limit)])
 def login_user(login_data: LoginRequest, session: pgSession):
     """Login a user and return JWT tokens"""
     # Find the user in the database
@@ -122,7 +129,7 @@ def login_user(login_data: LoginRequest, session: pgSession):
 
 @router.delete("/logout", status_code=200)
 def logout_user(token: checkToken, refresh_request: RefreshRequest, session: pgSession):
-    """Logout a user by revoking their refresh token"""
+    """Logout a user by revoking their refresh token and access token"""
     # Revoke the refresh token
     db_token = session.exec(
         select(RefreshToken).where(
@@ -135,6 +142,24 @@ def logout_user(token: checkToken, refresh_request: RefreshRequest, session: pgS
         db_token.revoked = True
         session.add(db_token)
         session.commit()
+
+    # Revoke the access token until it expires
+    user_info = decode_token(token)
+    jti = user_info.get("jti")
+    if jti:
+        session.add(RevokedToken(
+            jti=jti,
+            expires_at=datetime.utcfromtimestamp(user_info["exp"]),
+            user_id=user_info["user_id"]
+        ))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Already revoked by a concurrent logout on another worker
+            session.rollback()
+
+        # Reject the access token in this worker right away, others pick it up on their next sync
+        denylist.add(jti)
     
     return {"message": "Successfully logged out"}
 
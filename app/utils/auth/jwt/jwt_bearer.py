@@ -1,7 +1,9 @@
 from fastapi import Request, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
-from .jwt_handler import decode_token
+from .jwt_handler import decode_token, ADMIN_USER_IDS
+from .token_denylist import denylist
 
 class JWTBearer(HTTPBearer):
     """
@@ -51,29 +53,60 @@ class JWTBearer(HTTPBearer):
                 detail="Invalid authentication scheme. Use Bearer."
             )
             
-        if not self.verify_jwt(credentials.credentials):
+        # Decode once, the payload is reused for the revocation check
+        payload = decode_token(credentials.credentials)
+        if not payload:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Invalid token or expired token."
             )
+
+        if await self.is_revoked(payload):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Token has been revoked."
+            )
             
         return credentials.credentials
 
-    def verify_jwt(self, token: str) -> bool:
+    async def is_revoked(self, payload: dict) -> bool:
         """
-        Verify the JWT token validity
-        
+        Check the token id against the revoked access tokens
+
+        Valid tokens are cleared by an in-memory Bloom filter probe. The database
+        is only used to confirm Bloom hits, the denylist itself is synced in the
+        background (see token_denylist.sync_denylist).
+
         Args:
-            token (str): The JWT token to verify
-            
+            payload (dict): The decoded JWT payload
+
         Returns:
-            bool: True if the token is valid, False otherwise
+            bool: True if the token has been revoked, False otherwise
         """
-        try:
-            # Decode and validate the token
-            payload = decode_token(token)
-            
-            # If payload is empty, token is invalid or expired
-            return bool(payload)
-        except Exception:
-            return False 
+        jti = payload.get("jti")
+        if not denylist.might_be_revoked(jti):
+            return False
+        return await run_in_threadpool(denylist.is_revoked, jti)
+
+
+class AdminBearer(JWTBearer):
+    """
+    JWT Bearer security scheme restricted to the user ids listed in ADMIN_USER_IDS
+    """
+
+    async def __call__(self, request: Request) -> str:
+        """
+        Validate the JWT token and check that it belongs to an admin
+
+        Raises:
+            HTTPException: If the token is invalid or the user is not an admin
+        """
+        token = await super(AdminBearer, self).__call__(request)
+
+        if decode_token(token).get("user_id") not in ADMIN_USER_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Admin privileges required."
+            )
+
+        return token
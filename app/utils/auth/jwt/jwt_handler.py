@@ -17,6 +17,9 @@ JWT_SECRET = os.getenv("JWT_SECRET", "fallback_secret_for_development_only")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_SECONDS = int(os.getenv("ACCESS_TOKEN_EXPIRE_SECONDS", "3600"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Comma separated user ids allowed to use the admin endpoints (ids, not usernames,
+# since anyone can register a username that is not taken yet)
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()}
 
 
 def token_response(access_token: str, refresh_token: Optional[str] = None, expires_in: Optional[int] = None) -> Dict[str, Any]:
@@ -66,8 +69,8 @@ def create_access_token(data: dict, expires: Optional[timedelta] = None) -> str:
     else:
         expire = datetime.utcnow() + timedelta(seconds=ACCESS_TOKEN_EXPIRE_SECONDS)
     
-    # Add the expiration claim to the token payload
-    to_encode.update({"exp": int(expire.timestamp())})
+    # Add the expiration claim and a unique token id (used for revocation)
+    to_encode.update({"exp": int(expire.timestamp()), "jti": str(uuid.uuid4())})
     
     # Encode the JWT token
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
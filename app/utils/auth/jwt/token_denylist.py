@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Optional
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete
+from sqlmodel import Session, select
+from db.database import engine
+from app.models.user import RevokedToken
+
+# Set up logging
+logger = logging.getLogger("uvicorn")
+
+# Load environment variables from .env file
+load_dotenv()
+
+# =========================================
+# Denylist Configuration
+# =========================================
+# Expected number of revoked (not yet expired) access tokens
+DENYLIST_CAPACITY = int(os.getenv("DENYLIST_CAPACITY", "100000"))
+# Target false positive rate of the Bloom filter
+DENYLIST_ERROR_RATE = float(os.getenv("DENYLIST_ERROR_RATE", "0.001"))
+# Seconds between incremental syncs with the revoked_tokens table
+DENYLIST_REFRESH_SECONDS = float(os.getenv("DENYLIST_REFRESH_SECONDS", "5"))
+# Seconds of already synced rows re-read on each sync, covers transactions that
+# commit out of id / created_at order and clock skew between workers
+DENYLIST_SYNC_OVERLAP_SECONDS = float(os.getenv("DENYLIST_SYNC_OVERLAP_SECONDS", "60"))
+# Seconds between full rebuilds (drops ids of tokens that have expired)
+DENYLIST_REBUILD_SECONDS = float(os.getenv("DENYLIST_REBUILD_SECONDS", "3600"))
+# Number of recently revoked ids kept in the exact set
+DENYLIST_RECENT_SIZE = int(os.getenv("DENYLIST_RECENT_SIZE", "10000"))
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter for string keys
+
+    Uses double hashing over the two halves of the 64-bit str hash to derive
+    the bit positions.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Size the filter for the expected number of items
+
+        Args:
+            capacity (int): Expected number of items
+            error_rate (float): Target false positive rate
+        """
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _hashes(self, key: str):
+        # Every worker builds its own filter, so the per-process (randomized)
+        # str hash is enough and much cheaper than a cryptographic digest
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        return h & 0xFFFFFFFF, (h >> 32) | 1
+
+    def add(self, key: str) -> None:
+        h1, h2 = self._hashes(key)
+        for i in range(self.hash_count):
+            pos = (h1 + i * h2) % self.size
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        # Probed on every authenticated request, so the loop is kept inline
+        h1, h2 = self._hashes(key)
+        bits, size = self.bits, self.size
+        for i in range(self.hash_count):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class TokenDenylist:
+    """
+    Per-worker cache of revoked access token ids (jti)
+
+    The Bloom filter holds every revoked id that has not yet expired, so a valid
+    token is accepted after a single in-memory probe. Ids revoked recently are
+    also kept in an exact set; a Bloom hit that is not in that set is confirmed
+    against the database. The cache follows the revoked_tokens table by reading
+    only rows created after the newest one seen, minus an overlap window.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DENYLIST_CAPACITY,
+        error_rate: float = DENYLIST_ERROR_RATE,
+        refresh_seconds: float = DENYLIST_REFRESH_SECONDS,
+        overlap_seconds: float = DENYLIST_SYNC_OVERLAP_SECONDS,
+        rebuild_seconds: float = DENYLIST_REBUILD_SECONDS,
+        recent_size: int = DENYLIST_RECENT_SIZE,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.rebuild_seconds = rebuild_seconds
+        self.recent_size = recent_size
+
+        # Guards the filter and the recent set
+        self._lock = threading.Lock()
+        # Only one sync at a time
+        self._sync_lock = threading.Lock()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._recent: set = set()
+        self._recent_order: Deque[str] = deque()
+        self._last_seen: Optional[datetime] = None
+        self._last_rebuild: Optional[float] = None
+
+    def _remember(self, jti: str) -> None:
+        # Must be called with the lock held
+        self._bloom.add(jti)
+        if jti in self._recent:
+            return
+        self._recent.add(jti)
+        self._recent_order.append(jti)
+        while len(self._recent_order) > self.recent_size:
+            self._recent.discard(self._recent_order.popleft())
+
+    def add(self, jti: str) -> None:
+        """
+        Record a revocation made by this worker without waiting for the next sync
+
+        Args:
+            jti (str): The revoked token id
+        """
+        with self._lock:
+            self._remember(jti)
+
+    def might_be_revoked(self, jti: Optional[str]) -> bool:
+        """
+        Cheap in-memory check, never touches the database
+
+        Args:
+            jti (str, optional): The token id, tokens without one are not revocable
+
+        Returns:
+            bool: False if the token is definitely not revoked
+        """
+        return bool(jti) and jti in self._bloom
+
+    def is_revoked(self, jti: str) -> bool:
+        """
+        Exact check for ids that passed might_be_revoked
+
+        Args:
+            jti (str): The token id
+
+        Returns:
+            bool: True if the token has been revoked
+        """
+        if jti in self._recent:
+            return True
+        # Older revocation or a Bloom false positive: ask the database
+        with Session(engine) as session:
+            revoked = session.exec(
+                select(RevokedToken.id).where(RevokedToken.jti == jti)
+            ).first()
+        return revoked is not None
+
+    def refresh(self) -> None:
+        """
+        Sync with the revoked_tokens table
+
+        Loads only recent rows, except every rebuild_seconds when the filter is
+        rebuilt from scratch so that expired ids stop taking up space, and the
+        expired rows are deleted. Returns right away if another thread is
+        already syncing. The query runs without holding the lock used by add(),
+        so logouts never wait for it.
+
+        Raises:
+            Exception: Any database error, the current cache is left untouched
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            rebuild = self._last_rebuild is None or now - self._last_rebuild >= self.rebuild_seconds
+            query = select(RevokedToken.jti, RevokedToken.created_at).where(
+                RevokedToken.expires_at > datetime.utcnow()
+            )
+            if not rebuild and self._last_seen is not None:
+                query = query.where(RevokedToken.created_at > self._last_seen - self.overlap)
+
+            with Session(engine) as session:
+                rows = session.exec(query).all()
+                if rebuild:
+                    # Expired tokens are rejected by their exp claim already
+                    session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow()))
+                    session.commit()
+
+            bloom = None
+            if rebuild:
+                # Fill the new filter before swapping it in so readers never see it empty
+                bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.error_rate)
+                for jti, _ in rows:
+                    bloom.add(jti)
+
+            with self._lock:
+                if bloom is not None:
+                    # Keep ids added by this worker while the query was running
+                    for jti in self._recent_order:
+                        bloom.add(jti)
+                    self._bloom = bloom
+                    self._last_rebuild = now
+
+                for jti, created_at in rows:
+                    # Rows from the overlap window are usually known already
+                    if jti not in self._recent:
+                        self._remember(jti)
+                    if self._last_seen is None or created_at > self._last_seen:
+                        self._last_seen = created_at
+        finally:
+            self._sync_lock.release()
+
+
+async def sync_denylist(denylist: "TokenDenylist") -> None:
+    """
+    Keep a denylist in sync with the database, meant to run as a background task
+
+    The first sync must have been done before (see app.main.lifespan), failures
+    after that are logged and the current cache is kept until the next interval.
+
+    Args:
+        denylist (TokenDenylist): The denylist to refresh every refresh_seconds
+    """
+    while True:
+        await asyncio.sleep(denylist.refresh_seconds)
+        try:
+            await run_in_threadpool(denylist.refresh)
+        except Exception as e:
+            logger.error(f"Token denylist refresh failed: {e}")
+
+
+# Shared instance for this worker
+denylist = TokenDenylist()
@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# =========================================
+# Load Shedding Configuration
+# =========================================
+# Requests allowed in flight across all groups (roughly the threadpool size)
+LOAD_SHED_MAX_INFLIGHT = int(os.getenv("LOAD_SHED_MAX_INFLIGHT", "40"))
+# Latency (seconds) above which a group's limit is cut
+LOAD_SHED_TARGET_LATENCY = float(os.getenv("LOAD_SHED_TARGET_LATENCY", "0.5"))
+# Factor applied to a group's limit when latency goes over target
+LOAD_SHED_BACKOFF = float(os.getenv("LOAD_SHED_BACKOFF", "0.75"))
+# Fraction of a group's in-flight requests that must be over target before
+# requests still running are taken as a sign of overload (at least 2 of them)
+LOAD_SHED_STALE_FRACTION = float(os.getenv("LOAD_SHED_STALE_FRACTION", "0.5"))
+
+
+class AIMDLimit:
+    """
+    Additive increase / multiplicative decrease concurrency limit
+
+    Every request that finishes under the target latency grows the limit by
+    1/limit (about +1 per round trip of the whole window). A slow or failed
+    sample multiplies it by the backoff factor. After a decrease, the next
+    samples up to the in-flight count at that time are ignored for decreasing,
+    as they were started under the old limit: the limit is cut at most once per
+    round trip, however slow that round trip is.
+    """
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float, target_latency: float, backoff: float):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self._skip = 0
+
+    def on_sample(self, latency: float, failed: bool, inflight: int) -> None:
+        """
+        Update the limit with a finished request
+
+        Args:
+            latency (float): Request duration in seconds
+            failed (bool): Whether the request ended with a server error
+            inflight (int): Requests of the group still in flight
+        """
+        if failed or latency > self.target_latency:
+            self.on_overload(inflight)
+            return
+        if self._skip > 0:
+            self._skip -= 1
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_overload(self, inflight: int) -> None:
+        """
+        Record a slow or failed finished request
+
+        Args:
+            inflight (int): Requests of the group in flight
+        """
+        if self._skip > 0:
+            self._skip -= 1
+            return
+        self._decrease(inflight)
+
+    def on_stale(self, inflight: int) -> None:
+        """
+        Record that requests still in flight are over target
+
+        Only finished requests count towards the round trip, so this cuts the
+        limit if no cut happened in the current round trip, without using it up.
+
+        Args:
+            inflight (int): Requests of the group in flight
+        """
+        if self._skip == 0:
+            self._decrease(inflight)
+
+    def _decrease(self, inflight: int) -> None:
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._skip = max(inflight, 1)
+
+
+class RouteGroup:
+    """
+    Requests sharing a concurrency limit
+
+    The share is the fraction of the global in-flight budget the group may use,
+    so cheap groups keep being served after expensive ones start shedding.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        routes: Sequence[Tuple[str, str]],
+        share: float = 1.0,
+        max_inflight: Optional[int] = None,
+        target_latency: float = LOAD_SHED_TARGET_LATENCY,
+    ):
+        """
+        Args:
+            name (str): Name of the group, reported in the shed response
+            routes (Sequence[Tuple[str, str]]): (method, path regex) pairs, "*" matches any method
+            share (float, optional): Fraction of the global budget. Defaults to 1.0.
+            max_inflight (int, optional): Upper bound of the adaptive limit. Defaults to the global budget.
+            target_latency (float, optional): Latency target in seconds.
+        """
+        self.name = name
+        self.routes: List[Tuple[str, Pattern]] = [(method, re.compile(path)) for method, path in routes]
+        self.share = share
+        self.max_inflight = max_inflight
+        self.target_latency = target_latency
+        self.inflight = 0
+        # Start time of the requests in flight, oldest first
+        self.started: Dict[int, float] = {}
+        # Start time of the newest request already reported as stale
+        self.stale_reported = 0.0
+        self.limit: Optional[AIMDLimit] = None
+
+    def matches(self, method: str, path: str) -> bool:
+        return any((m == "*" or m == method) and pattern.fullmatch(path) for m, pattern in self.routes)
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware enforcing an adaptive in-flight limit per route group
+
+    A request is rejected with a fast 503 when its group is at its adaptive
+    limit, or when the total in-flight count is over the group's share of the
+    global budget. Besides finished requests, the requests still in flight are
+    checked on every arrival: when a large enough share of them is over target,
+    the limit is cut once for those requests, so it starts shrinking while a
+    stalled database still holds every request. A single stuck request among
+    healthy traffic is ignored. All counters are updated on the event loop
+    thread.
+    """
+
+    def __init__(
+        self,
+        app,
+        groups: Sequence[RouteGroup],
+        max_inflight: int = LOAD_SHED_MAX_INFLIGHT,
+        backoff: float = LOAD_SHED_BACKOFF,
+        stale_fraction: float = LOAD_SHED_STALE_FRACTION,
+    ):
+        self.app = app
+        self.stale_fraction = stale_fraction
+        self.groups = list(groups)
+        self.max_inflight = max_inflight
+        self.total_inflight = 0
+        self._next_request = 0
+        for group in self.groups:
+            max_limit = group.max_inflight or max_inflight
+            group.limit = AIMDLimit(
+                initial=max_limit,
+                min_limit=1,
+                max_limit=max_limit,
+                target_latency=group.target_latency,
+                backoff=backoff,
+            )
+
+    def find_group(self, method: str, path: str) -> Optional[RouteGroup]:
+        for group in self.groups:
+            if group.matches(method, path):
+                return group
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        group = self.find_group(scope["method"], scope["path"])
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        assert group.limit is not None
+        start = time.monotonic()
+        self.check_stale(group, start)
+
+        if group.inflight >= group.limit.limit or self.total_inflight >= self.max_inflight * group.share:
+            await self.shed(group, send)
+            return
+
+        request_id = self._next_request
+        self._next_request += 1
+        group.started[request_id] = start
+        group.inflight += 1
+        self.total_inflight += 1
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            del group.started[request_id]
+            group.inflight -= 1
+            self.total_inflight -= 1
+            group.limit.on_sample(time.monotonic() - start, status_code >= 500, group.inflight)
+
+    def check_stale(self, group: RouteGroup, now: float) -> None:
+        """
+        Cut the group's limit if enough requests in flight are over target
+
+        Each stale request is only reported once, so requests that stay stuck
+        do not keep cutting the limit.
+        """
+        stale = 0
+        newest_stale = 0.0
+        for started in group.started.values():
+            if now - started <= group.target_latency:
+                break
+            stale += 1
+            newest_stale = started
+
+        if newest_stale <= group.stale_reported:
+            return
+        if stale < max(2, self.stale_fraction * group.inflight):
+            return
+
+        assert group.limit is not None
+        group.limit.on_stale(group.inflight)
+        group.stale_reported = newest_stale
+
+    async def shed(self, group: RouteGroup, send) -> None:
+        body = json.dumps({"detail": f"Server overloaded ({group.name}), try again later."}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
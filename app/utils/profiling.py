@@ -0,0 +1,301 @@
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set
+from dotenv import load_dotenv
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+# Load environment variables from .env file
+load_dotenv()
+
+# =========================================
+# Profiling Configuration
+# =========================================
+# Seconds between stack samples
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+# Longest on-demand profile allowed, in seconds
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+# Requests slower than this (seconds) are captured
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", "1.0"))
+# Number of slow requests kept in memory
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+# SQL statements kept per request
+SLOW_REQUEST_MAX_SQL = int(os.getenv("SLOW_REQUEST_MAX_SQL", "200"))
+
+
+def collapse_stack(frame) -> str:
+    """
+    Format a stack in the collapsed (flamegraph) format, root first
+
+    Args:
+        frame: The innermost frame of the stack
+
+    Returns:
+        str: Frames as "module:function" joined with ";"
+    """
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    On-demand sampling profiler for every thread of the worker
+
+    Samples are taken from a separate thread with sys._current_frames(), so the
+    profiled code is never instrumented and the overhead is the cost of walking
+    the stacks once per interval. Only one profile can run at a time.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def run(self, seconds: float) -> Optional[str]:
+        """
+        Sample all threads for a number of seconds (blocking)
+
+        Args:
+            seconds (float): How long to sample, capped at PROFILE_MAX_SECONDS
+
+        Returns:
+            Optional[str]: Collapsed stacks with their sample counts, None if a
+                           profile is already running
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            own_thread = threading.get_ident()
+            samples: Counter = Counter()
+            deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own_thread:
+                        samples[collapse_stack(frame)] += 1
+                time.sleep(self.interval)
+            return "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
+        finally:
+            self._lock.release()
+
+
+class RequestCapture:
+    """Timings, SQL statements and stack samples of a request in flight"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.start = time.monotonic()
+        self.status_code: Optional[int] = None
+        self.duration: Optional[float] = None
+        # Threads running the endpoint right now (see ProfiledRoute)
+        self.threads: Set[int] = set()
+        self.sql: List[Dict[str, Any]] = []
+        self.samples: Counter = Counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            "sql": self.sql,
+            "stacks": "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()),
+        }
+
+
+# Capture of the request handled by the current context (copied into threadpool calls)
+current_capture: ContextVar[Optional[RequestCapture]] = ContextVar("current_capture", default=None)
+
+
+class SlowRequestRecorder:
+    """
+    Records requests slower than a threshold into a bounded ring buffer
+
+    SQL statements are collected for every request through SQLAlchemy cursor
+    events. Stack sampling only starts once a request has been running for
+    longer than the threshold, and only for the thread running its endpoint,
+    so fast requests pay for little more than a dict insert.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SLOW_REQUEST_THRESHOLD,
+        size: int = SLOW_REQUEST_BUFFER,
+        interval: float = PROFILE_SAMPLE_INTERVAL,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.records: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._active: Dict[int, RequestCapture] = {}
+        self._sampler: Optional[threading.Thread] = None
+
+    def instrument_engine(self, engine) -> None:
+        """
+        Record the SQL statements run by captured requests
+
+        Args:
+            engine: The SQLAlchemy engine to listen on
+        """
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Keep the start time on the per-statement execution context, it is dropped
+        # with the statement even when the query raises
+        if context is not None and current_capture.get() is not None:
+            context._query_start = time.monotonic()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        capture = current_capture.get()
+        start = getattr(context, "_query_start", None)
+        if capture is None or start is None:
+            return
+        elapsed = time.monotonic() - start
+        if len(capture.sql) < SLOW_REQUEST_MAX_SQL:
+            capture.sql.append({"statement": statement, "duration_ms": round(elapsed * 1000, 3)})
+
+    def _sample_loop(self) -> None:
+        idle_interval = max(self.interval, self.threshold / 10)
+        while True:
+            now = time.monotonic()
+            slow = [c for c in list(self._active.values()) if now - c.start >= self.threshold]
+            if not slow:
+                # Nothing to sample, check back at a fraction of the threshold
+                time.sleep(idle_interval)
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for capture in slow:
+                for thread_id in list(capture.threads):
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        capture.samples[collapse_stack(frame)] += 1
+
+    def start(self, capture: RequestCapture) -> None:
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name="slow-request-sampler", daemon=True)
+            self._sampler.start()
+        self._active[id(capture)] = capture
+
+    def finish(self, capture: RequestCapture) -> None:
+        self._active.pop(id(capture), None)
+        capture.duration = time.monotonic() - capture.start
+        if capture.duration >= self.threshold:
+            self.records.append(capture.to_dict())
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Latest captured slow requests, newest first"""
+        return list(reversed(self.records))[:limit]
+
+
+# Shared instances for this worker
+profiler = SamplingProfiler()
+slow_requests = SlowRequestRecorder()
+
+
+def track_thread(endpoint: Callable) -> Callable:
+    """
+    Wrap an endpoint so the thread running it is sampled for the current request
+
+    Sync endpoints run in a threadpool thread, which is registered only for the
+    duration of the call so a reused thread never mixes two requests. Async
+    endpoints register the event loop thread while they run.
+
+    Args:
+        endpoint (Callable): The route endpoint
+
+    Returns:
+        Callable: The wrapped endpoint, with the same signature for FastAPI
+    """
+    if getattr(endpoint, "_tracks_thread", False):
+        return endpoint
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            capture = current_capture.get()
+            if capture is None:
+                return await endpoint(*args, **kwargs)
+            thread_id = threading.get_ident()
+            capture.threads.add(thread_id)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                capture.threads.discard(thread_id)
+
+        wrapper: Callable = async_wrapper
+    else:
+        @functools.wraps(endpoint)
+        def sync_wrapper(*args, **kwargs):
+            capture = current_capture.get()
+            if capture is None:
+                return endpoint(*args, **kwargs)
+            thread_id = threading.get_ident()
+            capture.threads.add(thread_id)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                capture.threads.discard(thread_id)
+
+        wrapper = sync_wrapper
+
+    wrapper._tracks_thread = True  # type: ignore
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class registering the endpoint's thread with the slow request recorder
+
+    Usage:
+        router = APIRouter(route_class=ProfiledRoute)
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        super().__init__(path, track_thread(endpoint), **kwargs)
+
+
+class SlowRequestMiddleware:
+    """
+    ASGI middleware feeding the slow request recorder
+
+    Paths under exclude_prefixes are not captured, e.g. the admin endpoints,
+    where a profile run is slow on purpose and would push real slow requests
+    out of the ring buffer.
+    """
+
+    def __init__(self, app, recorder: SlowRequestRecorder = slow_requests, exclude_prefixes: Sequence[str] = ()):
+        self.app = app
+        self.recorder = recorder
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        capture = RequestCapture(scope["method"], scope["path"])
+        token = current_capture.set(capture)
+        self.recorder.start(capture)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                capture.status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.recorder.finish(capture)
+            current_capture.reset(token)
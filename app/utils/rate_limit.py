@@ -0,0 +1,349 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Request, HTTPException, status
+from app.utils.auth.jwt.jwt_handler import decode_token
+from app.utils.auth.jwt.token_denylist import denylist
+
+# Load environment variables from .env file
+load_dotenv()
+
+# =========================================
+# Rate Limit Configuration
+# =========================================
+# "memory" keeps buckets per worker, "shared" shares them between workers on this host
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# File backing the shared buckets (tmpfs so it never touches the disk)
+RATE_LIMIT_SHM_PATH = os.getenv("RATE_LIMIT_SHM_PATH", "/dev/shm/todo_rate_limit")
+# Number of bucket slots in the shared file
+RATE_LIMIT_SHM_SLOTS = int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536"))
+# Number of buckets kept by the memory backend before the least recently used are dropped
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Number of decoded bearer tokens cached for picking the user bucket
+RATE_LIMIT_TOKEN_CACHE = int(os.getenv("RATE_LIMIT_TOKEN_CACHE", "10000"))
+
+
+class MemoryBucketStore:
+    """
+    Token buckets kept in a dict of the current worker
+
+    Rate limit checks run as async dependencies, so they all execute on the event
+    loop thread and the buckets can be updated without any locking. The dict is
+    kept in least recently used order, so when it is full only the buckets that
+    have been idle the longest are dropped.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, List[float]] = {}
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """
+        Take one token from the bucket of a key
+
+        Args:
+            key (str): The bucket key
+            rate (float): Tokens added per second
+            burst (float): Bucket capacity
+            now (float): Current monotonic time
+
+        Returns:
+            float: 0 if the request is allowed, otherwise seconds until a token is available
+        """
+        # Pop and re-insert to move the bucket to the most recently used end
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+            tokens = burst
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+
+        if tokens < 1 and bucket is not None:
+            self._buckets[key] = bucket
+            return (1 - tokens) / rate
+
+        self._buckets[key] = [tokens - 1, now]
+        return 0.0
+
+
+class SharedBucketStore:
+    """
+    Token buckets in a memory mapped file shared by all workers on the host
+
+    Keys are hashed into a fixed table of slots. Each slot is guarded by a byte
+    range lock on the file, so workers only contend when they hit the same slot.
+    Two keys landing in the same slot reset each other's bucket, which can only
+    let extra requests through, never reject a client unfairly.
+    """
+
+    SLOT = struct.Struct("<Qdd")  # key fingerprint, tokens, last update
+
+    def __init__(self, path: str = RATE_LIMIT_SHM_PATH, slots: int = RATE_LIMIT_SHM_SLOTS):
+        # fcntl is only available on Unix, so only import it when this backend is used
+        import fcntl
+        self._fcntl = fcntl
+
+        self.slots = slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def take(self, key: str, rate: float, burst: float, now: float) -> float:
+        """
+        Take one token from the bucket of a key
+
+        Args:
+            key (str): The bucket key
+            rate (float): Tokens added per second
+            burst (float): Bucket capacity
+            now (float): Current monotonic time (shared by all processes on Linux)
+
+        Returns:
+            float: 0 if the request is allowed, otherwise seconds until a token is available
+        """
+        # hash() is randomized per process, so use a stable digest
+        fingerprint = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+        offset = (fingerprint % self.slots) * self.SLOT.size
+
+        self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, self.SLOT.size, offset)
+        try:
+            stored, tokens, last = self.SLOT.unpack_from(self._map, offset)
+            if stored != fingerprint:
+                tokens = burst
+            else:
+                tokens = min(burst, tokens + (now - last) * rate)
+
+            if tokens < 1:
+                return (1 - tokens) / rate
+
+            self.SLOT.pack_into(self._map, offset, fingerprint, tokens - 1, now)
+            return 0.0
+        finally:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, self.SLOT.size, offset)
+
+
+def create_store():
+    """Create the bucket store selected by RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == "shared":
+        return SharedBucketStore()
+    return MemoryBucketStore()
+
+
+# Shared store for every limiter in this worker
+store = create_store()
+
+
+class TokenClaimsCache:
+    """
+    Verified (user_id, jti, exp) claims of recently seen bearer tokens
+
+    Verifying a JWT costs far more than the rate limit check itself, so each
+    token is decoded once and its claims reused until it expires. Invalid
+    tokens are cached too, so garbage tokens can not force a decode per
+    request. Like MemoryBucketStore it is only used from the event loop thread
+    and kept in least recently used order.
+    """
+
+    def __init__(self, max_tokens: int = RATE_LIMIT_TOKEN_CACHE):
+        self.max_tokens = max_tokens
+        self._claims: Dict[str, Tuple[Optional[int], Optional[str], float]] = {}
+
+    def get(self, token: str) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Get the user_id and jti claims of a token
+
+        Args:
+            token (str): The encoded JWT
+
+        Returns:
+            Tuple[Optional[int], Optional[str]]: user_id and jti, (None, None) if the token is invalid or expired
+        """
+        claims = self._claims.pop(token, None)
+        if claims is None:
+            if len(self._claims) >= self.max_tokens:
+                del self._claims[next(iter(self._claims))]
+            payload = decode_token(token)
+            if payload:
+                claims = (payload.get("user_id"), payload.get("jti"), float(payload["exp"]))
+            else:
+                claims = (None, None, math.inf)
+
+        user_id, jti, exp = claims
+        if exp != math.inf and exp < time.time():
+            # Expired since it was cached: keep it as an invalid token
+            claims = (None, None, math.inf)
+            user_id, jti = None, None
+        self._claims[token] = claims
+        return user_id, jti
+
+
+# Shared cache for every limiter in this worker
+token_claims = TokenClaimsCache()
+
+
+class RateLimiter:
+    """
+    Token bucket rate limit dependency
+
+    Usage:
+        @router.post("/login", dependencies=[Depends(RateLimiter("login", times=5, seconds=60))])
+
+    Requests are always counted per client IP. With key="user" they are also
+    counted per user_id claim of a valid, non revoked bearer token, so a client
+    can not multiply its quota by switching tokens or going anonymous.
+
+    The client IP is request.client.host. Behind a reverse proxy, run uvicorn
+    with --proxy-headers --forwarded-allow-ips=<proxy ip> so that it is taken
+    from X-Forwarded-For, otherwise every client shares the proxy's buckets.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        times: int,
+        seconds: float,
+        burst: Optional[int] = None,
+        key: str = "ip",
+        ip_times: Optional[int] = None,
+    ):
+        """
+        Initialize the rate limiter
+
+        Args:
+            scope (str): Name of the limit, routes with the same scope share buckets
+            times (int): Number of requests allowed per period
+            seconds (float): Length of the period in seconds
+            burst (int, optional): Bucket capacity. Defaults to times.
+            key (str, optional): "ip" or "user". Defaults to "ip".
+            ip_times (int, optional): Requests per period and IP when key="user". Defaults to times.
+        """
+        if key not in ("ip", "user"):
+            raise ValueError(f"Unknown rate limit key: {key}")
+        self.scope = scope
+        self.rate = times / seconds
+        self.burst = float(burst if burst is not None else times)
+        self.key = key
+        ip_times = ip_times if ip_times is not None else times
+        self.ip_rate = ip_times / seconds
+        self.ip_burst = float(max(ip_times, burst or 0))
+        self._ip_prefix = f"{scope}:ip:"
+        self._user_prefix = f"{scope}:user:"
+
+    def user_id(self, request: Request) -> Optional[int]:
+        """
+        Get the user_id claim of a valid bearer token
+
+        Tokens that may be revoked (Bloom filter hit) are treated as anonymous,
+        the exact check would cost a database query.
+
+        Args:
+            request (Request): The FastAPI request object
+
+        Returns:
+            Optional[int]: The user id, None for anonymous requests
+        """
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme != "Bearer" or not token:
+            return None
+        user_id, jti = token_claims.get(token)
+        if user_id is None or denylist.might_be_revoked(jti):
+            return None
+        return user_id
+
+    def buckets(self, request: Request) -> List[Tuple[str, float, float]]:
+        """
+        Build the buckets the request has to take a token from
+
+        Args:
+            request (Request): The FastAPI request object
+
+        Returns:
+            List[Tuple[str, float, float]]: (key, rate, burst) of each bucket
+        """
+        # Read the scope directly, request.client builds a new Address on every access
+        client = request.scope.get("client")
+        ip_key = self._ip_prefix + (client[0] if client else "unknown")
+        if self.key == "ip":
+            return [(ip_key, self.rate, self.burst)]
+
+        buckets = [(ip_key, self.ip_rate, self.ip_burst)]
+        user_id = self.user_id(request)
+        if user_id is not None:
+            buckets.append((f"{self._user_prefix}{user_id}", self.rate, self.burst))
+        return buckets
+
+    async def __call__(self, request: Request) -> None:
+        """
+        Reject the request if any of its buckets is empty
+
+        Raises:
+            HTTPException: 429 with a Retry-After header if the limit is exceeded
+        """
+        now = time.monotonic()
+        for key, rate, burst in self.buckets(request):
+            retry_after = store.take(key, rate, burst, now)
+            if retry_after:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many requests.",
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+
+
+if __name__ == "__main__":
+    # Overhead of a whole RateLimiter check per request:
+    #   DB_URL=sqlite:// python -m app.utils.rate_limit
+    # (importing the revoked token denylist creates the database engine, the
+    # benchmark itself never connects)
+    import timeit
+    from app.utils.auth.jwt.jwt_handler import create_access_token
+
+    def bench_request(i: int, token: Optional[str] = None) -> Request:
+        headers = [(b"authorization", f"Bearer {token}".encode("latin-1"))] if token else []
+        return Request({
+            "type": "http",
+            "method": "POST",
+            "path": "/deep",
+            "headers": headers,
+            "client": (f"10.0.{i // 256}.{i % 256}", 12345),
+        })
+
+    # The check never awaits, so drive the coroutine directly instead of timing an event loop
+    def run_check(limiter: RateLimiter, request: Request) -> None:
+        try:
+            limiter(request).send(None)
+        except StopIteration:
+            pass
+
+    tokens = [create_access_token({"sub": f"bench{i}", "user_id": i}) for i in range(100)]
+    cases = {
+        'key="ip"': (RateLimiter("bench_ip", times=10**9, seconds=1), [bench_request(i) for i in range(1000)]),
+        'key="user"': (
+            RateLimiter("bench_user", times=10**9, seconds=1, key="user"),
+            [bench_request(i, tokens[i % 100]) for i in range(1000)],
+        ),
+    }
+
+    bench_path = f"{RATE_LIMIT_SHM_PATH}.bench"
+    try:
+        for store in (MemoryBucketStore(), SharedBucketStore(bench_path)):
+            for name, (limiter, requests) in cases.items():
+                counter = iter(range(10**9))
+
+                def check():
+                    run_check(limiter, requests[next(counter) % 1000])
+
+                runs = 100000
+                elapsed = timeit.timeit(check, number=runs)
+                print(f"{type(store).__name__} {name}: {elapsed / runs * 1e6:.2f} us per request")
+    finally:
+        if os.path.exists(bench_path):
+            os.unlink(bench_path)
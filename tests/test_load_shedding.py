@@ -0,0 +1,98 @@
+import asyncio
+from app.utils.load_shedding import AIMDLimit, LoadSheddingMiddleware, RouteGroup
+
+
+def make_limit() -> AIMDLimit:
+    return AIMDLimit(initial=40, min_limit=1, max_limit=40, target_latency=0.05, backoff=0.75)
+
+
+def test_slow_samples_cut_once_per_round_trip():
+    limit = make_limit()
+    # 10 slow requests finish while 10 were in flight: one round trip, one cut
+    for inflight in range(9, -1, -1):
+        limit.on_sample(1.0, False, inflight)
+    assert limit.limit == 30
+    # Next round trip
+    limit.on_sample(1.0, False, 0)
+    assert limit.limit == 22.5
+
+
+def test_stale_signal_does_not_use_up_round_trip():
+    limit = make_limit()
+    limit.on_sample(1.0, False, 5)
+    assert limit.limit == 30
+    # Stale requests seen during the round trip neither cut nor end it
+    for _ in range(100):
+        limit.on_stale(5)
+    assert limit.limit == 30
+    assert limit._skip == 5
+
+
+class SlowApp:
+    """ASGI app where /slow blocks until released and other paths answer right away"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def __call__(self, scope, receive, send):
+        if scope["path"] == "/slow":
+            await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def call(middleware, path: str) -> int:
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await middleware({"type": "http", "method": "GET", "path": path}, None, send)
+    return statuses[0]
+
+
+def make_middleware(app):
+    group = RouteGroup("reads", [("GET", r"/.*")], target_latency=0.05)
+    return LoadSheddingMiddleware(app, [group], max_inflight=40), group
+
+
+def test_one_stuck_request_does_not_shed_healthy_traffic():
+    async def scenario():
+        app = SlowApp()
+        middleware, group = make_middleware(app)
+        stuck = asyncio.create_task(call(middleware, "/slow"))
+        await asyncio.sleep(0.1)
+
+        fast = [await call(middleware, "/fast") for _ in range(30)]
+        concurrent = await asyncio.gather(*[call(middleware, "/fast") for _ in range(10)])
+        limit = group.limit.limit
+
+        app.release.set()
+        await stuck
+        return fast, concurrent, limit
+
+    fast, concurrent, limit = asyncio.run(scenario())
+    assert fast == [200] * 30
+    assert concurrent == [200] * 10
+    assert limit >= 39
+
+
+def test_stalled_group_sheds_before_requests_finish():
+    async def scenario():
+        app = SlowApp()
+        middleware, group = make_middleware(app)
+        stuck = [asyncio.create_task(call(middleware, "/slow")) for _ in range(30)]
+        await asyncio.sleep(0.1)
+
+        # Nothing has finished yet, the stale requests alone cut the limit
+        statuses = await asyncio.gather(*[call(middleware, "/fast") for _ in range(5)])
+        limit = group.limit.limit
+
+        app.release.set()
+        await asyncio.gather(*stuck)
+        return statuses, limit
+
+    statuses, limit = asyncio.run(scenario())
+    assert limit == 30
+    assert statuses == [503] * 5